@@ -1,26 +1,68 @@
-import requests
-import feedparser
+import argparse
+import asyncio
 from datetime import datetime, timezone, timedelta
-import subprocess
 import time
 import os
+import json
 import re
+import functools
+import hashlib
+import io
+import logging
+import sys
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-
-TOPICS = [
+import signal
+import sqlite3
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter, namedtuple
+from lxml import etree
+import httpx
+from aiolimiter import AsyncLimiter
+from email.message import EmailMessage
+
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # optional: the semantic pre-filter is skipped without it
+    np = None
+    SentenceTransformer = None
+
+try:
+    import ahocorasick
+except ImportError:  # optional: the keyword pre-filter falls back to plain substring checks
+    ahocorasick = None
+
+DEFAULT_TOPICS = [
     "unstructured data analysis",
     "querying unstructured data",
     "semi structured data",
     "text to table",
     "text to relational schema",
 ]
+TOPICS = DEFAULT_TOPICS  # replace with your own list of topics
 MAX_RESULTS = 10
-MODEL = "gemma2:2b"  
+MODEL = "qwen2.5:1.5b-instruct-q4_K_M"  # 4-bit quantized: a yes/no classifier does not need full-precision weights
 DAYS_BACK = 7  # look back at last 7 days
-VERBOSE = True
-RELEVANT_PAPERS_FILE = "relevant_papers.txt"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG")  # INFO for less output
+ARXIV_MIN_INTERVAL = 3.0  # seconds between arXiv API requests (arXiv asks for at most one every 3s)
+ARXIV_CONCURRENCY = 2  # arXiv requests in flight at once, on top of the interval limit
+ARXIV_RETRIES = 3  # retries with exponential backoff for arXiv's rate-limit and 5xx responses
+DECISION_DB_FILE = "decisions.db"
+RELEVANT_PAPERS_FILE = "relevant_papers.txt"  # legacy cache, imported once
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # sentence-transformers model for the semantic pre-filter
+SIMILARITY_REJECT_BELOW = 0.25  # best topic similarity below this -> NOT RELEVANT without the LLM
+SIMILARITY_ACCEPT_ABOVE = 0.55  # best topic similarity above this -> RELEVANT without the LLM
+KEYWORD_PREFILTER = True  # reject papers with none of the _POS_FAST keywords; only applies to DEFAULT_TOPICS
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_CHAT_URL = f"{OLLAMA_URL.rstrip('/')}/api/chat"
+OLLAMA_TIMEOUT = 300  # seconds per Ollama request of at most LLM_BATCH_SIZE papers; leaves room for a cold model load
+OLLAMA_KEEP_ALIVE = "1h"  # keep the model loaded between requests instead of reloading it
+# Concurrent Ollama requests; read from the variable `ollama serve` itself uses, so one export sets both
+OLLAMA_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+OLLAMA_NUM_CTX = 2048  # context per request slot: rubric + LLM_BATCH_SIZE truncated abstracts + answers, with headroom
+LLM_BATCH_SIZE = 8  # papers classified per Ollama request
+ABSTRACT_MAX_CHARS = 400  # abstract prefix sent to the LLM; the opening sentences carry the relevance signal
 
 
 USER_EMAIL = os.getenv("USER_EMAIL", "")  # Your email address
@@ -29,89 +71,343 @@ SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))  # 587 for TLS
 SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")  # Usually same as USER_EMAIL
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")  # Use app password for Gmail, NOT YOUR REGULAR PASSWORD
 
+logger = logging.getLogger("paper-flow")
+
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+
+# The handful of Atom fields the agent uses; authors and categories are tuples of names / terms
+Entry = namedtuple("Entry", "title summary published id link authors categories")
+
+# Everything the concurrent topic tasks of one pipeline run share
+RunState = namedtuple(
+    "RunState",
+    "client limiter fetch_slots llm_slots conn prefilter keyword_screen seen relevant_papers"
+    " new_relevant_papers pending_rows stats week_ago now",
+)
+
+# Sent with every arXiv request; httpx negotiates gzip-compressed feeds on its own
+ARXIV_HEADERS = {"User-Agent": "paper-flow/1.0"}
+ARXIV_RETRY_STATUSES = (429, 500, 502, 503, 504)  # rate-limited, overloaded or a failing gateway
+# One "<n>: YES" / "<n>: NO" answer line of a batch LLM response; "[n] YES" is accepted too
+_ANSWER_RE = re.compile(r"^\s*\[?(\d+)\]?\s*[:.)]?\s*(YES|NO)\b", re.I | re.M)
+# arXiv IDs are 'YYMM.NNNN' or 'YYMM.NNNNN'; the URL's only such token is the ID itself
+_ARXIV_ID_RE = re.compile(r'(?:abs/)?(\d{4}\.\d{4,5})')
+# Keyword screen ahead of the embedding and LLM stages: a paper needs at least one of these in
+# its lowercased title or abstract to be worth asking the model about. Written for DEFAULT_TOPICS;
+# with any other TOPICS the keyword screen is off. " ir " is padded so "their" and "pair" don't match
+_POS_FAST = (
+    "unstructured", "semi-structured", "semi structured", "schema", "json", "xml",
+    "text-to-table", "text to table", "table extract", "tabular", "relational",
+    "querying text", "document", "retrieval", " ir ",
+)
+# With pyahocorasick installed, all keywords are matched in one pass over the text, however many there are
+_POS_AUTOMATON = None
+if ahocorasick is not None:
+    _POS_AUTOMATON = ahocorasick.Automaton()
+    for _keyword in _POS_FAST:
+        _POS_AUTOMATON.add_word(_keyword, _keyword)
+    _POS_AUTOMATON.make_automaton()
+# arXiv category prefixes of fields the topics never cover; papers filed only under these are rejected
+_NEG_FAST = ("astro-ph", "hep-", "gr-qc", "cond-mat")
+
+# Leading system message of every filter request. It is byte-identical across calls, so Ollama
+# reuses the cached KV state for it and only prefills the papers of each batch
+RUBRIC = """You are filtering COMPUTER SCIENCE papers for relevance to data management and processing.
+Topics: unstructured data analysis; querying unstructured data; semi-structured data (JSON, XML); text-to-table conversion; text-to-relational schema.
+A paper is relevant only if it is DIRECTLY and SUBSTANTIALLY about one of these topics. Answer NO for natural-science papers, general ML/AI, databases without an unstructured/semi-structured focus, and papers that only use data analysis as a tool.
+For each numbered paper, output one line "<n>: YES" or "<n>: NO". Do not explain."""
+# Part of every LLM decision's cache key, so editing the rubric retires decisions made under the old one
+RUBRIC_HASH = hashlib.sha256(RUBRIC.encode("utf-8")).hexdigest()[:16]
+
+# Who made a decision: the model recorded in its row, and the settings its cache key depends on
+Decider = namedtuple("Decider", "model key")
+LLM_DECIDER = Decider(MODEL, f"{MODEL}\n{RUBRIC_HASH}")
+# Pre-filter decisions depend on the embedding model, the thresholds and the topics compared against
+PREFILTER_DECIDER = Decider(
+    EMBEDDING_MODEL,
+    f"{EMBEDDING_MODEL}\n{SIMILARITY_REJECT_BELOW}\n{SIMILARITY_ACCEPT_ABOVE}\n" + "\n".join(TOPICS),
+)
+
+
 def extract_paper_id(entry) -> str:
     """Extract arXiv paper ID from entry (e.g., '1234.5678' from 'http://arxiv.org/abs/1234.5678v1')."""
     # entry.id typically looks like: http://arxiv.org/abs/1234.5678v1
     # or entry.link might be: http://arxiv.org/abs/1234.5678
-    id_str = getattr(entry, 'id', getattr(entry, 'link', ''))
-    # Extract the numeric part (e.g., 1234.5678)
-    match = re.search(r'/(\d{4}\.\d{4,5})', id_str)
-    if match:
-        return match.group(1)
-    # Fallback: try to extract any pattern that looks like an arXiv ID
-    match = re.search(r'(\d{4}\.\d{4,5})', id_str)
-    if match:
-        return match.group(1)
-    return None
-
-
-def load_relevant_paper_ids(file_path: str) -> set:
-    """Load existing relevant paper IDs from the txt file."""
-    if not os.path.exists(file_path):
-        if VERBOSE:
-            print(f"[DEBUG] Cache file '{file_path}' does not exist, starting with empty cache")
-        return set()
-    
-    paper_ids = set()
+    id_str = entry.id or entry.link
+    # Extract the numeric part (e.g., 1234.5678) in a single scan
+    match = _ARXIV_ID_RE.search(id_str)
+    return match.group(1) if match else None
+
+
+def open_decision_db(file_path: str) -> sqlite3.Connection:
+    """Open (creating if needed) the SQLite database holding every relevance decision.
+
+    Each row keeps the paper's label and published date; relevant papers also
+    keep their "formatted" report entry, so cache hits never rebuild it. The
+    hash column ties a decision to the settings of the model that made it, named
+    in the model column, and to the paper text it was made for.
+    """
+    conn = sqlite3.connect(file_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    is_new = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='decisions'"
+    ).fetchone() is None
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS decisions("
+        "id TEXT PRIMARY KEY, label INT, date TEXT, formatted TEXT, hash TEXT, model TEXT, ts INT)"
+    )
+    # Databases from before decisions were tied to a model lack the last three columns
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(decisions)")}
+    for column, column_type in (("hash", "TEXT"), ("model", "TEXT"), ("ts", "INT")):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE decisions ADD COLUMN {column} {column_type}")
+    conn.commit()
+    if is_new:
+        logger.debug("Created decision database '%s'", file_path)
+        import_legacy_cache(conn)
+    else:
+        logger.debug("Opened decision database '%s'", file_path)
+    return conn
+
+
+def import_legacy_cache(conn: sqlite3.Connection):
+    """Seed a fresh decision database from the older relevant-IDs-only cache file."""
+    rows = {}
+    if os.path.exists(RELEVANT_PAPERS_FILE):
+        try:
+            # One ID per line: a single read and C-level split, which also drops empty lines
+            with open(RELEVANT_PAPERS_FILE, 'rb') as f:
+                data = f.read()
+            for raw_id in data.split():
+                paper_id = raw_id.decode('utf-8')
+                rows[paper_id] = (paper_id, 1, None, None, None, None, None)
+        except Exception as e:
+            logger.warning("Failed to import legacy cache file '%s': %s", RELEVANT_PAPERS_FILE, e)
+    if rows:
+        save_decisions(conn, list(rows.values()))
+        logger.debug("Imported %s decisions from legacy cache file '%s'", len(rows), RELEVANT_PAPERS_FILE)
+
+
+def decision_hash(title: str, abstract: str, decider: Decider) -> str:
+    """Key a decision to the settings of whoever made it and the exact paper text it was made for."""
+    paper_hash = hashlib.sha256(f"{title}\n{abstract}".encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{decider.key}\n{paper_hash}".encode("utf-8")).hexdigest()
+
+
+def lookup_decision(conn: sqlite3.Connection, paper_id: str, content_hashes: tuple[str, ...]) -> tuple[dict | None, bool]:
+    """Return (cached decision record or None if it has to be judged (again), previously relevant).
+
+    content_hashes holds the paper's current hash for each decider. A record made
+    under other settings, or for an earlier version of the abstract, is stale;
+    legacy records without a hash are trusted as they are. A stale record's
+    label still tells whether the paper was already notified.
+    """
+    row = conn.execute(
+        "SELECT label, date, formatted, hash FROM decisions WHERE id=?", (paper_id,)
+    ).fetchone()
+    if row is None:
+        return None, False
+    if row[3] is not None and row[3] not in content_hashes:
+        logger.debug("Cached decision for paper ID '%s' is stale (model, settings or abstract changed)", paper_id)
+        return None, bool(row[0])
+    return {"label": bool(row[0]), "date": row[1], "formatted": row[2]}, bool(row[0])
+
+
+def invalidate_decisions(conn: sqlite3.Connection):
+    """Mark every cached decision stale, so each paper is judged again the next time it is seen."""
+    with conn:
+        count = conn.execute("UPDATE decisions SET hash = ''").rowcount
+    logger.info("Invalidated %s cached decisions", count)
+
+
+def save_decisions(conn: sqlite3.Connection, rows: list[tuple]):
+    """Insert or replace a batch of (id, label, date, formatted, hash, model, ts) rows in one transaction."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                paper_id = line.strip()
-                if paper_id:  # Skip empty lines
-                    paper_ids.add(paper_id)
-        if VERBOSE:
-            print(f"[DEBUG] Loaded {len(paper_ids)} paper IDs from cache file '{file_path}'")
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO decisions(id, label, date, formatted, hash, model, ts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        logger.debug("Saved %s decisions to the decision database", len(rows))
     except Exception as e:
-        print(f"[WARN] Failed to load cache file '{file_path}': {e}")
-        if VERBOSE:
-            print(f"[DEBUG] Exception details: {type(e).__name__}: {str(e)}")
-    
-    return paper_ids
+        logger.warning("Failed to save %s decisions to the decision database: %s", len(rows), e)
+        logger.debug("Exception details: %s: %s", type(e).__name__, e)
 
 
-def save_paper_id(file_path: str, paper_id: str):
-    """Append a paper ID to the cache file."""
+def load_embedding_model():
+    """Load the sentence-transformers model, or return None if it is unavailable."""
+    if SentenceTransformer is None:
+        logger.debug("sentence-transformers not installed, semantic pre-filter disabled")
+        return None
     try:
-        with open(file_path, 'a', encoding='utf-8') as f:
-            f.write(f"{paper_id}\n")
-        if VERBOSE:
-            print(f"[DEBUG] Saved paper ID '{paper_id}' to cache file '{file_path}'")
+        start_time = time.time()
+        model = SentenceTransformer(EMBEDDING_MODEL)
+        logger.debug("Loaded embedding model '%s' in %.2fs", EMBEDDING_MODEL, time.time() - start_time)
+        return model
     except Exception as e:
-        print(f"[WARN] Failed to save paper ID '{paper_id}' to cache file '{file_path}': {e}")
-        if VERBOSE:
-            print(f"[DEBUG] Exception details: {type(e).__name__}: {str(e)}")
+        logger.warning("Failed to load embedding model '%s', semantic pre-filter disabled: %s", EMBEDDING_MODEL, e)
+        return None
 
 
-def query_arxiv(keyword: str, max_results: int = 20):
-    if VERBOSE:
-        print(f"[DEBUG] Querying arXiv API for: '{keyword}' (max_results={max_results})")
+def keyword_screen_enabled() -> bool:
+    """The keyword lists only describe the topics they were written for, so edited TOPICS turn the screen off."""
+    if not KEYWORD_PREFILTER:
+        return False
+    if TOPICS != DEFAULT_TOPICS:
+        logger.info("TOPICS differ from the ones the keyword pre-filter was written for, keyword pre-filter disabled")
+        return False
+    return True
+
+
+def keyword_reject(entry) -> bool:
+    """Return True if the paper is clearly off-topic, so it can be rejected without any model."""
+    if entry.categories and all(category.startswith(_NEG_FAST) for category in entry.categories):
+        return True
+    blob = f"{entry.title} {entry.summary}".lower()
+    if _POS_AUTOMATON is not None:
+        return next(_POS_AUTOMATON.iter(blob), None) is None
+    return not any(keyword in blob for keyword in _POS_FAST)
+
+
+def semantic_prefilter(model, topic_embeddings, papers: list[tuple[str, str]]) -> list[bool | None]:
+    """Decide clear-cut (title, abstract) papers by cosine similarity to the topics.
+
+    Returns False below SIMILARITY_REJECT_BELOW, True above SIMILARITY_ACCEPT_ABOVE
+    and None for the ambiguous middle band that still needs the LLM.
+    """
+    # Every paper embedded here ends up with a cached decision, so its vector is never needed again
+    texts = [f"{title} {abstract}" for title, abstract in papers]
+    vectors = model.encode(texts, batch_size=32, normalize_embeddings=True)
+    logger.debug("Embedded %s paper(s)", len(papers))
+    
+    # Embeddings are normalized, so the dot product is the cosine similarity
+    best_similarity = (np.asarray(vectors) @ topic_embeddings.T).max(axis=1)
+    decisions = []
+    for (title, _), similarity in zip(papers, best_similarity):
+        if similarity < SIMILARITY_REJECT_BELOW:
+            decision = False
+        elif similarity > SIMILARITY_ACCEPT_ABOVE:
+            decision = True
+        else:
+            decision = None
+        decisions.append(decision)
+        if logger.isEnabledFor(logging.DEBUG):
+            outcome = "needs LLM" if decision is None else "RELEVANT" if decision else "NOT RELEVANT"
+            logger.debug("Best topic similarity %.3f (%s): '%s...'", similarity, outcome, title[:60])
+    return decisions
+
+
+async def query_arxiv(
+    client: httpx.AsyncClient,
+    limiter: AsyncLimiter,
+    fetch_slots: asyncio.Semaphore,
+    keyword: str,
+    max_results: int = 20,
+):
+    logger.debug("Querying arXiv API for: '%s' (max_results=%s)", keyword, max_results)
     url = (
         f"http://export.arxiv.org/api/query?"
         f"search_query=all:{keyword.replace(' ', '+')}"
         f"&start=0&max_results={max_results}"
         f"&sortBy=submittedDate&sortOrder=descending"
     )
-    if VERBOSE:
-        print(f"[DEBUG] Request URL: {url}")
-    start_time = time.time()
-    resp = requests.get(url, timeout=15)
-    elapsed = time.time() - start_time
-    if VERBOSE:
-        print(f"[DEBUG] API response received in {elapsed:.2f}s (status: {resp.status_code})")
-    feed = feedparser.parse(resp.text)
-    entry_count = len(feed.entries)
-    if VERBOSE:
-        print(f"[DEBUG] Parsed {entry_count} entries from feed")
-    return feed.entries
-
-
-def parse_llm_response(output: str) -> tuple[bool, str]:
+    logger.debug("Request URL: %s", url)
+    for attempt in range(ARXIV_RETRIES + 1):
+        # Both are shared by all topics: requests start ARXIV_MIN_INTERVAL apart, and a slow
+        # response never lets more than ARXIV_CONCURRENCY pile up against export.arxiv.org
+        async with fetch_slots, limiter:
+            start_time = time.time()
+            resp = await client.get(url, timeout=15)
+        elapsed = time.time() - start_time
+        logger.debug("API response received in %.2fs (status: %s)", elapsed, resp.status_code)
+        if resp.status_code not in ARXIV_RETRY_STATUSES or attempt == ARXIV_RETRIES:
+            break
+        delay = 2 ** attempt
+        logger.debug("arXiv returned %s, retrying in %ss", resp.status_code, delay)
+        await asyncio.sleep(delay)
+    resp.raise_for_status()
+    # Parse in a worker thread so the event loop keeps streaming other topics' LLM answers meanwhile
+    entries = await asyncio.to_thread(parse_arxiv_feed, resp.content)
+    logger.debug("Parsed %s entries from feed", len(entries))
+    return entries
+
+
+def parse_arxiv_feed(content: bytes) -> list[Entry]:
+    """Stream-parse an arXiv Atom feed, keeping only the fields the agent uses."""
+    try:
+        return parse_feed_entries(content)
+    except etree.XMLSyntaxError as e:
+        # Truncated or otherwise broken responses still hold usable entries; libxml2's
+        # recovery mode keeps whatever it can instead of failing the whole topic
+        logger.warning("Malformed arXiv feed (%s), re-parsing in recovery mode", e)
+        return parse_feed_entries(content, recover=True)
+
+
+def parse_feed_entries(content: bytes, recover: bool = False) -> list[Entry]:
+    """Collect the feed's entries; recover lets libxml2 skip past broken markup.
+
+    In recovery mode the entry the feed was cut off in comes back half-built, so
+    entries missing their id, published date or summary are dropped.
+    """
+    entries = []
+    events = etree.iterparse(io.BytesIO(content), events=("end",), tag=f"{ATOM_NS}entry", recover=recover)
+    for _, elem in events:
+        link = elem.findtext(f"{ATOM_NS}id", "")
+        for link_elem in elem.iterfind(f"{ATOM_NS}link"):
+            if link_elem.get("rel") == "alternate":
+                link = link_elem.get("href", link)
+                break
+        entry = Entry(
+            title=elem.findtext(f"{ATOM_NS}title", ""),
+            summary=elem.findtext(f"{ATOM_NS}summary", ""),
+            published=elem.findtext(f"{ATOM_NS}published", ""),
+            id=elem.findtext(f"{ATOM_NS}id", ""),
+            link=link,
+            authors=tuple(name.text or "" for name in elem.iterfind(f"{ATOM_NS}author/{ATOM_NS}name")),
+            categories=tuple(cat.get("term", "") for cat in elem.iterfind(f"{ATOM_NS}category")),
+        )
+        if not recover or entry_complete(entry):
+            entries.append(entry)
+        else:
+            logger.warning("Dropping incomplete entry '%s' from malformed feed", entry.id or entry.title[:60])
+        # Free the parsed entry (and any already-processed siblings) to keep memory flat
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+    return entries
+
+
+def entry_complete(entry) -> bool:
+    """Return True if the entry has an id, a summary and a parseable published date."""
+    if not (entry.id and entry.summary and entry.published):
+        return False
+    try:
+        parse_arxiv_ts(entry.published)
+    except ValueError:
+        return False
+    return True
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_arxiv_ts(s: str) -> datetime:
+    """Parse arXiv's 'YYYY-MM-DDTHH:MM:SSZ' timestamp into an aware UTC datetime.
+
+    fromisoformat is a C fast path; the cache covers papers that overlapping
+    topics return more than once.
+    """
+    return datetime.fromisoformat(s.replace("Z", "+00:00"))
+
+
+def parse_llm_response(output: str) -> tuple[bool | None, str]:
+    """Read a single bare YES/NO answer; anything else is None (undecided, so not cached)."""
     if not output:
-        return False, "(empty)"
+        return None, "(empty)"
     
     words = output.strip().split()
     if not words:
-        return False, "(empty)"
+        return None, "(empty)"
     
     first_word = words[0].strip().upper().rstrip('.,!?:;')
     
@@ -120,82 +416,181 @@ def parse_llm_response(output: str) -> tuple[bool, str]:
     elif first_word == "NO":
         return False, first_word
     else:
-        if VERBOSE:
-            print(f"[WARN] Unexpected answer: '{first_word}' - treating as NOT RELEVANT")
-        return False, first_word
+        logger.warning("Unexpected answer: '%s' - leaving the paper undecided", first_word)
+        return None, first_word
 
 
-def llm_filter(title: str, abstract: str) -> bool:
-    if VERBOSE:
-        print(f"[DEBUG] Filtering paper: '{title[:60]}...'")
-        print(f"[DEBUG] Abstract length: {len(abstract)} characters")
-    prompt = f"""You are filtering papers for relevance to COMPUTER SCIENCE topics about data management and processing.
-
-The paper must be DIRECTLY and SUBSTANTIALLY related to one or more of these specific topics:
-- Unstructured data analysis (methods for analyzing text, documents, or unstructured formats)
-- Querying unstructured data (searching, querying, or retrieving information from unstructured sources)
-- Semi-structured data analysis (working with JSON, XML, or other semi-structured formats)
-- Text-to-table conversion (extracting structured tables from unstructured text)
-- Text-to-relational schema (converting text into database schemas or relational models)
-
-EXCLUDE papers that are:
-- About physics, astronomy, biology, chemistry, or other natural sciences (even if they mention "data analysis")
-- About general machine learning or AI without focus on data management/processing
-- About databases or data systems without focus on unstructured/semi-structured data
-- Only tangentially related (e.g., using data analysis as a tool but not about data management itself)
+def build_batch_prompt(papers: list[tuple[str, str]]) -> str:
+    """Build the per-request part of the prompt: the enumerated papers and the expected answer count."""
+    # Prompt length drives prefill time, so only the start of each abstract is sent
+    paper_blocks = "".join(
+        f"{i}. Title: {title}\n   Abstract: {abstract.strip()[:ABSTRACT_MAX_CHARS]}\n"
+        for i, (title, abstract) in enumerate(papers, 1)
+    )
+    return f"Papers:\n{paper_blocks}\nRespond with exactly {len(papers)} lines."
 
-Title: {title}
-Abstract: {abstract}
 
-Is this paper DIRECTLY about computer science topics related to unstructured/semi-structured data management, querying, or conversion? 
+def parse_batch_response(output: str, count: int) -> list[bool | None]:
+    """Map numbered "<n>: YES/NO" lines back to paper positions; unanswered papers come back as None."""
+    decisions = [None] * count
+    answers = _ANSWER_RE.findall(output)
 
-Respond with ONLY one word: YES or NO. Do not explain."""
-    if VERBOSE:
-        print(f"[DEBUG] Calling Ollama with model: {MODEL}")
-        print(f"[DEBUG] Prompt length: {len(prompt)} characters")
+    if not answers:
+        # Malformed batch output; a lone paper can still be rescued by the single-answer parser
+        if count == 1:
+            is_relevant, extracted_answer = parse_llm_response(output)
+            logger.debug("Batch format not found, fallback answer: '%s'", extracted_answer)
+            decisions[0] = is_relevant
+        else:
+            logger.warning("Could not parse batch LLM output - leaving all %s papers undecided", count)
+        return decisions
+
+    answered = set()
+    for index_str, answer in answers:
+        index = int(index_str)
+        if 1 <= index <= count and index not in answered:
+            answered.add(index)
+            decisions[index - 1] = answer.upper() == "YES"
+
+    if len(answered) < count:
+        missing = sorted(set(range(1, count + 1)) - answered)
+        logger.warning("No answer for paper(s) %s - leaving them undecided", missing)
+    return decisions
+
+
+def batch_answers_complete(output: str, count: int) -> bool:
+    """Return True once the (partial) LLM output already holds an answer for all count papers."""
+    answered = {int(index) for index, _ in _ANSWER_RE.findall(output)}
+    if answered >= set(range(1, count + 1)):
+        return True
+    # A lone paper is settled by the bare YES/NO the single-answer parser accepts
+    if count == 1:
+        words = output.split()
+        return bool(words) and words[0].upper().rstrip('.,!?:;') in ("YES", "NO")
+    return False
+
+
+async def warm_up_model(client: httpx.AsyncClient):
+    """Ask Ollama to load MODEL now so the first filter request does not pay for the load."""
     start_time = time.time()
     try:
-        result = subprocess.run(
-            ["ollama", "run", MODEL],
-            input=prompt.encode("utf-8"),
-            capture_output=True,
-            check=True,
+        # An empty conversation only loads the model; keep_alive pins it for the rest of the run
+        resp = await client.post(
+            OLLAMA_CHAT_URL,
+            json={
+                "model": MODEL,
+                "messages": [],
+                "stream": False,
+                "keep_alive": OLLAMA_KEEP_ALIVE,
+                "options": {"num_ctx": OLLAMA_NUM_CTX},  # load with the context size the filter requests use
+            },
+            timeout=OLLAMA_TIMEOUT,
         )
-        elapsed = time.time() - start_time
-        
-        stdout_text = result.stdout.decode('utf-8', errors='replace') if isinstance(result.stdout, bytes) else result.stdout
-        output = stdout_text.strip()
-        if VERBOSE:
-            print(f"[DEBUG] LLM response received in {elapsed:.2f}s")
+        resp.raise_for_status()
+        logger.debug("Model '%s' loaded in %.2fs", MODEL, time.time() - start_time)
+    except Exception as e:
+        logger.warning("Failed to warm up model '%s': %s", MODEL, e)
+
+
+def split_into_batches(papers: list, batch_size: int) -> list[list]:
+    """Split papers into contiguous batches of at most batch_size."""
+    return [papers[i:i + batch_size] for i in range(0, len(papers), batch_size)]
+
+
+async def llm_filter(
+    client: httpx.AsyncClient, slots: asyncio.Semaphore, papers: list[tuple[str, str]]
+) -> list[bool | None]:
+    """Classify a batch of (title, abstract) pairs with a single Ollama request.
+
+    At most OLLAMA_PARALLEL requests hold a slot at once, across all topics.
+
+    Papers missing from a batch answer are retried one per request. None marks
+    a paper the LLM still gave no usable answer for; it is treated as NOT
+    RELEVANT for this run but not cached, so the next run retries it.
+    """
+    if not papers:
+        return []
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Filtering batch of %s paper(s):", len(papers))
+        for i, (title, abstract) in enumerate(papers, 1):
+            logger.debug("  [%s] '%s...' (abstract: %s characters)", i, title[:60], len(abstract))
+    prompt = build_batch_prompt(papers)
+    payload = {
+        "model": MODEL,
+        "messages": [
+            {"role": "system", "content": RUBRIC},
+            {"role": "user", "content": prompt},
+        ],
+        "stream": True,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        # Greedy decoding; num_ctx stays fixed because changing it between requests reloads the model
+        "options": {
+            "num_ctx": OLLAMA_NUM_CTX,
+            "num_predict": 6 * len(papers),
+            "temperature": 0,
+            "top_k": 1,
+            "top_p": 1,
+        },
+    }
+    logger.debug("Calling Ollama at %s with model: %s", OLLAMA_CHAT_URL, MODEL)
+    logger.debug("Prompt length: %s characters", len(prompt))
+    try:
+        chunks = []
+        async with slots:
+            start_time = time.time()
+            # Stream tokens and hang up as soon as every paper has its answer; closing the
+            # connection makes Ollama stop decoding whatever the model would have added
+            async with client.stream("POST", OLLAMA_CHAT_URL, json=payload, timeout=OLLAMA_TIMEOUT) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    chunks.append(chunk.get("message", {}).get("content", ""))
+                    if chunk.get("done") or batch_answers_complete("".join(chunks), len(papers)):
+                        break
+            elapsed = time.time() - start_time
+
+        output = "".join(chunks).strip()
+        logger.debug("LLM response received in %.2fs", elapsed)
+        # The output dump slices multi-kilobyte strings, so skip it entirely unless it will be shown
+        if logger.isEnabledFor(logging.DEBUG):
             if output:
                 
                 if len(output) <= 500:
-                    print(f"[DEBUG] Raw LLM output (full): {output}")
+                    logger.debug("Raw LLM output (full): %s", output)
                 else:
-                    print(f"[DEBUG] Raw LLM output (first 500 chars): {output[:500]}...")
-                    print(f"[DEBUG] Raw LLM output (last 200 chars): ...{output[-200:]}")
-                print(f"[DEBUG] Raw LLM output length: {len(output)} characters")
+                    logger.debug("Raw LLM output (first 500 chars): %s...", output[:500])
+                    logger.debug("Raw LLM output (last 200 chars): ...%s", output[-200:])
+                logger.debug("Raw LLM output length: %s characters", len(output))
             else:
-                print(f"[DEBUG] Raw LLM output: (EMPTY - no response received)")
+                logger.debug("Raw LLM output: (EMPTY - no response received)")
         
-        is_relevant, extracted_answer = parse_llm_response(output)
-        if VERBOSE:
-            print(f"[DEBUG] Extracted answer: '{extracted_answer}'")
-            print(f"[DEBUG] Relevance decision: {'RELEVANT' if is_relevant else 'NOT RELEVANT'}")
-        return is_relevant
+        decisions = parse_batch_response(output, len(papers))
+        missing = [i for i, decision in enumerate(decisions) if decision is None]
+        if missing and len(papers) > 1:
+            # Small models sometimes drop or garble lines of a long batch; a lone paper rarely fails
+            logger.debug("Retrying %s unanswered paper(s) one at a time", len(missing))
+            retried = await asyncio.gather(*(llm_filter(client, slots, [papers[i]]) for i in missing))
+            for i, (decision,) in zip(missing, retried):
+                decisions[i] = decision
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, is_relevant in enumerate(decisions, 1):
+                label = "UNDECIDED" if is_relevant is None else "RELEVANT" if is_relevant else "NOT RELEVANT"
+                logger.debug("Relevance decision [%s]: %s", i, label)
+        return decisions
     except Exception as e:
-        print(f"[WARN] LLM filter failed: {e}")
-        if VERBOSE:
-            print(f"[DEBUG] Exception type: {type(e).__name__}")
-            print(f"[DEBUG] Exception details: {str(e)}")
-        return False
+        logger.warning("LLM filter failed: %s", e)
+        logger.debug("Exception type: %s", type(e).__name__)
+        logger.debug("Exception details: %s", e)
+        return [None] * len(papers)
 
 
 def format_entry(entry):
     """Return a formatted string for each arXiv entry."""
     return (
         f"Title: {entry.title.strip()}\n"
-        f"Authors: {', '.join(a.name for a in entry.authors)}\n"
+        f"Authors: {', '.join(entry.authors)}\n"
         f"Date: {entry.published}\n"
         f"Link: {entry.link}\n"
         f"Summary: {entry.summary.strip()[:600]}...\n"
@@ -203,211 +598,376 @@ def format_entry(entry):
     )
 
 
+def email_configured() -> bool:
+    return bool(USER_EMAIL and SMTP_USERNAME and SMTP_PASSWORD)
+
+
+def open_smtp_connection() -> smtplib.SMTP:
+    """Connect to SMTP_SERVER, switch to TLS and log in."""
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=30)
+    try:
+        server.starttls()  # Enable TLS encryption
+        server.login(SMTP_USERNAME, SMTP_PASSWORD)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
 def send_batch_email_notification(papers_list):
-    """Send a single email notification with all new relevant papers found."""
+    """Send a single email notification for the (entry, paper_id, published_date) tuples in papers_list."""
     if not papers_list:
         return False
         
-    if not USER_EMAIL or not SMTP_USERNAME or not SMTP_PASSWORD:
-        if VERBOSE:
-            print(f"[WARN] Email configuration incomplete. Skipping email notification.")
-            print(f"[DEBUG] USER_EMAIL: {'set' if USER_EMAIL else 'not set'}")
-            print(f"[DEBUG] SMTP_USERNAME: {'set' if SMTP_USERNAME else 'not set'}")
-            print(f"[DEBUG] SMTP_PASSWORD: {'set' if SMTP_PASSWORD else 'not set'}")
+    if not email_configured():
+        logger.warning("Email configuration incomplete. Skipping email notification.")
+        logger.debug("USER_EMAIL: %s", 'set' if USER_EMAIL else 'not set')
+        logger.debug("SMTP_USERNAME: %s", 'set' if SMTP_USERNAME else 'not set')
+        logger.debug("SMTP_PASSWORD: %s", 'set' if SMTP_PASSWORD else 'not set')
         return False
     
     try:
         # Create email message
-        msg = MIMEMultipart()
+        msg = EmailMessage()
         msg['From'] = SMTP_USERNAME
         msg['To'] = USER_EMAIL
         
         paper_count = len(papers_list)
         if paper_count == 1:
-            msg['Subject'] = f"New Relevant arXiv Paper Found: {papers_list[0][0].title.strip()[:60]}"
+            # arXiv titles wrap across lines, and header values may not contain newlines
+            title = " ".join(papers_list[0][0].title.split())
+            msg['Subject'] = f"New Relevant arXiv Paper Found: {title[:60]}"
         else:
             msg['Subject'] = f"New Relevant arXiv Papers Found: {paper_count} papers"
         
-        # Create email body with all papers (only title, link, and date)
-        body = f"""Found {paper_count} new relevant paper{'s' if paper_count > 1 else ''} on arXiv!
-
-"""
-        for entry, paper_id in papers_list:
-            # Format date nicely
-            published_date = datetime.strptime(
-                entry.published, "%Y-%m-%dT%H:%M:%SZ"
-            ).strftime("%Y-%m-%d")
-            
-            body += f"Title: {entry.title.strip()}\n"
-            body += f"Date: {published_date}\n"
-            body += f"Link: {entry.link}\n"
-            body += f"{'-'*80}\n\n"
-        
-        msg.attach(MIMEText(body, 'plain'))
+        # Create email body with all papers (only title, link, and date), joined once
+        parts = [f"Found {paper_count} new relevant paper{'s' if paper_count > 1 else ''} on arXiv!\n\n"]
+        for entry, paper_id, published_date in papers_list:
+            parts.append(
+                f"Title: {' '.join(entry.title.split())}\n"
+                f"Date: {published_date:%Y-%m-%d}\n"
+                f"Link: {entry.link}\n"
+                f"{'-'*80}\n\n"
+            )
+        msg.set_content("".join(parts))
         
         # Send email
-        if VERBOSE:
-            print(f"[DEBUG] Sending email notification to {USER_EMAIL}...")
+        logger.debug("Sending email notification to %s...", USER_EMAIL)
         
         server = None
         try:
-            server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-            server.starttls()  # Enable TLS encryption
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            text = msg.as_string()
-            server.sendmail(SMTP_USERNAME, USER_EMAIL, text)
+            server = open_smtp_connection()
+            server.send_message(msg)
             
-            if VERBOSE:
-                print(f"[INFO] Email notification sent successfully to {USER_EMAIL}")
+            logger.info("Email notification sent successfully to %s", USER_EMAIL)
             return True
         finally:
             if server:
                 try:
                     server.quit()
                 except Exception as quit_error:
-                    if VERBOSE:
-                        print(f"[DEBUG] Error closing SMTP connection: {quit_error}")
+                    logger.debug("Error closing SMTP connection: %s", quit_error)
         
     except Exception as e:
-        print(f"[WARN] Failed to send email notification: {e}")
-        if VERBOSE:
-            print(f"[DEBUG] Exception details: {type(e).__name__}: {str(e)}")
+        logger.warning("Failed to send email notification: %s", e)
+        logger.debug("Exception details: %s: %s", type(e).__name__, e)
         return False
 
 
-def main():
-    if VERBOSE:
-        print("[DEBUG] Starting arXiv agent...")
-        print(f"[DEBUG] Configuration:")
-        print(f"  - Topics: {len(TOPICS)} topics")
-        print(f"  - Max results per topic: {MAX_RESULTS}")
-        print(f"  - Model: {MODEL}")
-        print(f"  - Days back: {DAYS_BACK}")
-        print(f"  - Verbose mode: {VERBOSE}")
-    
-    cached_paper_ids = load_relevant_paper_ids(RELEVANT_PAPERS_FILE)
-    
-    now = datetime.now(timezone.utc)
-    week_ago = now - timedelta(days=DAYS_BACK)
-    if VERBOSE:
-        print(f"[DEBUG] Date range: {week_ago.date()} to {now.date()}")
-        print(f"[DEBUG] Current UTC time: {now}")
-    
-    relevant_papers = []
-    new_relevant_papers = []  
-    total_entries_processed = 0
-    total_entries_in_range = 0
-    total_llm_calls = 0
-    total_cached_hits = 0
-
-    for idx, topic in enumerate(TOPICS, 1):
-        if VERBOSE:
-            print(f"\n[INFO] Processing topic {idx}/{len(TOPICS)}: '{topic}'")
-        print(f"\n--- Searching for: {topic} ---\n")
-
-        entries = query_arxiv(topic, MAX_RESULTS)
-        total_entries_processed += len(entries)
-        
-        if VERBOSE:
-            print(f"[DEBUG] Found {len(entries)} total entries for topic '{topic}'")
+async def process_topic(topic: str, run: RunState):
+    """Fetch one topic's feed, judge its new papers, and record the outcome in the shared run state.
 
-        topic_relevant_count = 0
-        for entry_idx, entry in enumerate(entries, 1):
-            if VERBOSE:
-                print(f"[DEBUG] Processing entry {entry_idx}/{len(entries)} for topic '{topic}'")
-            
-            published_date = datetime.strptime(
-                entry.published, "%Y-%m-%dT%H:%M:%SZ"
-            ).replace(tzinfo=timezone.utc)
-
-            if VERBOSE:
-                print(f"[DEBUG] Entry published date: {published_date.date()}")
-
-            # keep entries published in the last 7 days
-            if not (week_ago <= published_date <= now):
-                if VERBOSE:
-                    print(f"[DEBUG] Entry outside date range, skipping")
-                continue
-
-            total_entries_in_range += 1
-            if VERBOSE:
-                print(f"[DEBUG] Entry within date range, checking relevance...")
-
-            title = entry.title
-            abstract = entry.summary
-            
-            # Extract paper ID
-            paper_id = extract_paper_id(entry)
-            if not paper_id:
-                if VERBOSE:
-                    print(f"[WARN] Could not extract paper ID for entry, skipping cache check")
-                paper_id = None
-            
-            is_relevant = False
-            if paper_id and paper_id in cached_paper_ids:
-                is_relevant = True
-                total_cached_hits += 1
-                if VERBOSE:
-                    print(f"[DEBUG] Paper ID '{paper_id}' found in cache, skipping LLM call")
+    New decisions are only queued in run.pending_rows, which main() writes to the decision
+    database when the run ends. run.seen maps each paper (by arXiv ID, or entry id when that
+    has none) to a future resolved with its relevance by whichever topic claimed it first; the
+    claiming topic always resolves its futures before waiting on anyone else's.
+    """
+    try:
+        entries = await query_arxiv(run.client, run.limiter, run.fetch_slots, topic, MAX_RESULTS)
+    except Exception as e:
+        logger.warning("arXiv query for '%s' failed: %s", topic, e)
+        return
+    logger.info("--- Processing topic '%s' ---", topic)
+    run.stats["entries_processed"] += len(entries)
+
+    logger.debug("Found %s total entries for topic '%s'", len(entries), topic)
+
+    week_ago_str = run.week_ago.strftime("%Y-%m-%d")
+    loop = asyncio.get_running_loop()
+    topic_relevant_count = 0
+    judged_papers = []  # (entry, paper_id, decision record)
+    llm_candidates = []  # (entry, paper_id, published_date) awaiting the batch LLM call
+    claimed = {}  # paper key -> future this topic must resolve
+    notified = set()  # IDs of re-judged papers whose stale record was relevant, so already emailed
+    duplicates = []  # futures of papers claimed by another topic
+    for entry_idx, entry in enumerate(entries, 1):
+        logger.debug("Processing entry %s/%s for topic '%s'", entry_idx, len(entries), topic)
+
+        # Cheap string check first: ISO dates sort lexically. The feed is sorted newest first,
+        # so once one entry predates the window every later one does too
+        if entry.published[:10] < week_ago_str:
+            logger.debug("Entry published %s, outside date range, skipping the rest of the feed", entry.published[:10])
+            break
+
+        published_date = parse_arxiv_ts(entry.published)
+
+        logger.debug("Entry published date: %s", published_date.date())
+
+        # keep entries published in the last 7 days
+        if published_date < run.week_ago:
+            logger.debug("Entry outside date range, skipping the rest of the feed")
+            break
+        if published_date > run.now:
+            logger.debug("Entry outside date range, skipping")
+            continue
+
+        run.stats["entries_in_range"] += 1
+        logger.debug("Entry within date range, checking cache...")
+
+        # Extract paper ID
+        paper_id = extract_paper_id(entry)
+        if not paper_id:
+            logger.warning("Could not extract paper ID for entry, skipping cache check")
+            paper_id = None
+
+        # Overlapping topics often return the same paper; judge and report it only once, before
+        # any cache lookup or LLM call. Entries without an arXiv ID are matched on their feed id
+        paper_key = paper_id or entry.id
+        if paper_key and paper_key in run.seen:
+            run.stats["duplicates"] += 1
+            duplicates.append(run.seen[paper_key])
+            logger.debug("Paper '%s' already claimed by another topic, skipping", paper_key)
+            continue
+        if paper_key:
+            claimed[paper_key] = run.seen[paper_key] = loop.create_future()
+
+        if paper_id:
+            content_hashes = tuple(
+                decision_hash(entry.title, entry.summary, decider) for decider in (LLM_DECIDER, PREFILTER_DECIDER)
+            )
+            record, previously_relevant = lookup_decision(run.conn, paper_id, content_hashes)
+        else:
+            record, previously_relevant = None, False
+        if previously_relevant:
+            notified.add(paper_id)
+        if record is not None:
+            run.stats["cached_hits"] += 1
+            judged_papers.append((entry, paper_id, record))
+            logger.debug("Paper ID '%s' found in cache, skipping LLM call", paper_id)
+        elif run.keyword_screen and keyword_reject(entry):
+            # Not cached: the check costs microseconds, and retuned keywords then apply immediately
+            run.stats["keyword_rejections"] += 1
+            judged_papers.append((entry, paper_id, {"label": False, "date": entry.published[:10]}))
+            logger.debug("No topic keywords in '%s...', skipping LLM call", entry.title[:60])
+        else:
+            if paper_id:
+                logger.debug("Paper ID '%s' not in cache, queued for batch LLM check", paper_id)
             else:
-                
-                if VERBOSE:
-                    if paper_id:
-                        print(f"[DEBUG] Paper ID '{paper_id}' not in cache, checking with LLM...")
-                    else:
-                        print(f"[DEBUG] Paper ID unknown, checking with LLM...")
-                
-                total_llm_calls += 1
-                is_relevant = llm_filter(title, abstract)
-                
-                if is_relevant:
-                    is_new_paper = not paper_id or paper_id not in cached_paper_ids
-                    
-                    if paper_id:
-                        cached_paper_ids.add(paper_id)
-                        save_paper_id(RELEVANT_PAPERS_FILE, paper_id)
-                        if VERBOSE:
-                            print(f"[INFO] Added paper ID '{paper_id}' to cache")
-                    
-                    if is_new_paper:
-                        new_relevant_papers.append((entry, paper_id))
-                        if VERBOSE:
-                            print(f"[INFO] New relevant paper found, queued for email notification")
-            
+                logger.debug("Paper ID unknown, queued for batch LLM check")
+            llm_candidates.append((entry, paper_id, published_date))
+
+    try:
+        new_decisions = []  # (entry, paper_id, published_date, decision, decider)
+        if llm_candidates and run.prefilter is not None:
+            embedding_model, topic_embeddings = run.prefilter
+            try:
+                # Encoding is CPU-bound, so keep it off the event loop
+                prefilter_decisions = await asyncio.to_thread(
+                    semantic_prefilter,
+                    embedding_model,
+                    topic_embeddings,
+                    [(entry.title, entry.summary) for entry, _, _ in llm_candidates],
+                )
+            except Exception as e:
+                # The pre-filter only saves LLM calls; without it every candidate goes to the LLM
+                logger.warning("Semantic pre-filter failed for topic '%s', using the LLM only: %s", topic, e)
+                prefilter_decisions = [None] * len(llm_candidates)
+            undecided = []
+            for candidate, decision in zip(llm_candidates, prefilter_decisions):
+                if decision is None:
+                    undecided.append(candidate)
+                else:
+                    run.stats["prefilter_decisions"] += 1
+                    new_decisions.append((*candidate, decision, PREFILTER_DECIDER))
+            llm_candidates = undecided
+
+        # The remaining uncached papers go out in batches of LLM_BATCH_SIZE; the shared
+        # semaphore keeps at most OLLAMA_PARALLEL requests in flight across all topics
+        if llm_candidates:
+            batches = split_into_batches(
+                [(entry.title, entry.summary) for entry, _, _ in llm_candidates], LLM_BATCH_SIZE
+            )
+            run.stats["llm_calls"] += len(batches)
+            batch_results = await asyncio.gather(*(llm_filter(run.client, run.llm_slots, batch) for batch in batches))
+            llm_decisions = [decision for batch_decisions in batch_results for decision in batch_decisions]
+            new_decisions.extend(
+                (*candidate, decision, LLM_DECIDER) for candidate, decision in zip(llm_candidates, llm_decisions)
+            )
+
+        decided_at = int(time.time())
+        for entry, paper_id, published_date, decision, decider in new_decisions:
+            is_relevant = bool(decision)
+
+            # Cache both outcomes so neither is sent to the LLM again
+            record = {"label": is_relevant, "date": entry.published[:10]}
+            if is_relevant:
+                record["formatted"] = format_entry(entry)
+            if paper_id and decision is not None:
+                run.pending_rows.append((
+                    paper_id, int(is_relevant), record["date"], record.get("formatted"),
+                    decision_hash(entry.title, entry.summary, decider), decider.model, decided_at,
+                ))
+                logger.debug("Added decision for paper ID '%s' to cache", paper_id)
+
+            # Anything judged here missed the cache; only a stale record can mean it was already notified
+            if is_relevant and paper_id not in notified:
+                run.new_relevant_papers.append((entry, paper_id, published_date))
+                logger.info("New relevant paper found, queued for email notification")
+            judged_papers.append((entry, paper_id, record))
+
+        for entry, paper_id, record in judged_papers:
+            is_relevant = record["label"]
+            paper_key = paper_id or entry.id
+            if paper_key in claimed:
+                claimed[paper_key].set_result(is_relevant)
             if is_relevant:
                 topic_relevant_count += 1
-                relevant_papers.append((published_date.date(), format_entry(entry)))
-                if VERBOSE:
-                    print(f"[INFO] Paper marked as RELEVANT: '{title[:60]}...'")
+                # Cached records carry the finished report line; only legacy ones need rebuilding
+                run.relevant_papers[paper_id or entry.id] = (
+                    record.get("date") or entry.published[:10],
+                    record.get("formatted") or format_entry(entry),
+                )
+                logger.info("Paper marked as RELEVANT: '%s...'", entry.title[:60])
             else:
-                if VERBOSE:
-                    print(f"[INFO] Paper marked as NOT RELEVANT: '{title[:60]}...'")
+                logger.debug("Paper marked as NOT RELEVANT: '%s...'", entry.title[:60])
+    finally:
+        # Never leave another topic waiting on a paper this one failed to judge
+        for future in claimed.values():
+            if not future.done():
+                future.set_result(False)
+
+    for future in duplicates:
+        if await future:
+            topic_relevant_count += 1
+
+    logger.info("Topic '%s' summary: %s relevant papers found", topic, topic_relevant_count)
+
+
+async def run_pipeline(conn, prefilter, pending_rows, week_ago, now):
+    """Fetch and filter every topic concurrently; returns (relevant_papers, new_relevant_papers, stats).
+
+    New decision rows are appended to pending_rows for the caller to save.
+    """
+    # One pooled client for the whole run, so arXiv and Ollama connections are kept alive and
+    # reused; the transport also retries failed connection attempts. requests used to follow
+    # redirects on its own, httpx only does when asked
+    transport = httpx.AsyncHTTPTransport(retries=ARXIV_RETRIES)
+    async with httpx.AsyncClient(headers=ARXIV_HEADERS, transport=transport, follow_redirects=True) as client:
+        run = RunState(
+            client=client,
+            limiter=AsyncLimiter(1, ARXIV_MIN_INTERVAL),
+            fetch_slots=asyncio.Semaphore(ARXIV_CONCURRENCY),
+            llm_slots=asyncio.Semaphore(OLLAMA_PARALLEL),
+            conn=conn,
+            prefilter=prefilter,
+            keyword_screen=keyword_screen_enabled(),
+            seen={},  # paper key -> future resolving to is_relevant, owned by the first topic that found it
+            relevant_papers={},  # report key (paper ID, or entry id if unknown) -> ("YYYY-MM-DD", formatted entry)
+            new_relevant_papers=[],
+            pending_rows=pending_rows,
+            stats=Counter(),
+            week_ago=week_ago,
+            now=now,
+        )
+        # Each topic is filtered as soon as its own feed arrives, while later feeds are still
+        # waiting on the arXiv rate limit; the model warm-up overlaps with the first download
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(warm_up_model(client))
+            for topic in TOPICS:
+                tg.create_task(process_topic(topic, run))
+    return run.relevant_papers, run.new_relevant_papers, run.stats
+
+
+def main(invalidate: bool = False):
+    logger.debug("Starting arXiv agent...")
+    logger.debug("Configuration:")
+    logger.debug("  - Topics: %s topics", len(TOPICS))
+    logger.debug("  - Max results per topic: %s", MAX_RESULTS)
+    logger.debug("  - Model: %s", MODEL)
+    logger.debug("  - Parallel LLM requests: %s", OLLAMA_PARALLEL)
+    logger.debug("  - Days back: %s", DAYS_BACK)
+    logger.debug("  - Log level: %s", LOG_LEVEL)
+
+    prefilter = None  # (model, topic embeddings) when the semantic pre-filter is available
+    embedding_model = load_embedding_model()
+    if embedding_model is not None:
+        try:
+            prefilter = (embedding_model, embedding_model.encode(TOPICS, normalize_embeddings=True))
+        except Exception as e:
+            logger.warning("Failed to embed TOPICS, semantic pre-filter disabled: %s", e)
 
-        if VERBOSE:
-            print(f"[INFO] Topic '{topic}' summary: {topic_relevant_count} relevant papers found")
-        
-        if idx < len(TOPICS):
-            if VERBOSE:
-                print(f"[DEBUG] Waiting 3 seconds before next topic (rate limiting)...")
-            time.sleep(3)  # Respecting the arXiv API
-
-    if new_relevant_papers:
-        if VERBOSE:
-            print(f"\n[INFO] Pipeline complete. Sending single email notification for {len(new_relevant_papers)} new relevant paper(s)...")
-        send_batch_email_notification(new_relevant_papers)
-    else:
-        if VERBOSE:
-            print(f"\n[INFO] Pipeline complete. No new relevant papers found, skipping email notification.")
+    now = datetime.now(timezone.utc)
+    week_ago = now - timedelta(days=DAYS_BACK)
+    logger.debug("Date range: %s to %s", week_ago.date(), now.date())
+    logger.debug("Current UTC time: %s", now)
 
-    if VERBOSE:
-        print(f"\n[DEBUG] Processing complete:")
-        print(f"  - Total entries retrieved: {total_entries_processed}")
-        print(f"  - Entries in date range: {total_entries_in_range}")
-        print(f"  - Cache hits (skipped LLM): {total_cached_hits}")
-        print(f"  - Total LLM calls made: {total_llm_calls}")
-        print(f"  - Relevant papers found: {len(relevant_papers)}")
+    with closing(open_decision_db(DECISION_DB_FILE)) as conn:
+        if invalidate:
+            invalidate_decisions(conn)
+        pending_rows = []  # new decisions, written in a single transaction once the run ends
+        try:
+            relevant_papers, new_relevant_papers, stats = asyncio.run(
+                run_pipeline(conn, prefilter, pending_rows, week_ago, now)
+            )
+        finally:
+            # Also reached on Ctrl-C, and on SIGTERM through exit_on_sigterm, so an interrupted
+            # run keeps every decision it already paid for
+            if pending_rows:
+                save_decisions(conn, pending_rows)
+
+    # The SMTP handshake and send run on a worker thread while the run statistics are logged.
+    # Nothing is enqueued, and no SMTP session opened, when there is nothing to send
+    email_pool = ThreadPoolExecutor(max_workers=1)
+    try:
+        pending_email = None
+        if new_relevant_papers:
+            logger.info("Pipeline complete. Sending single email notification for %s new relevant paper(s)...", len(new_relevant_papers))
+            pending_email = email_pool.submit(send_batch_email_notification, new_relevant_papers)
+        else:
+            logger.info("Pipeline complete. No new relevant papers found, skipping email notification.")
 
+        logger.debug("Processing complete:")
+        logger.debug("  - Total entries retrieved: %s", stats["entries_processed"])
+        logger.debug("  - Entries in date range: %s", stats["entries_in_range"])
+        logger.debug("  - Duplicates across topics (skipped): %s", stats["duplicates"])
+        logger.debug("  - Cache hits (skipped LLM): %s", stats["cached_hits"])
+        logger.debug("  - Keyword pre-filter rejections (skipped LLM): %s", stats["keyword_rejections"])
+        logger.debug("  - Semantic pre-filter decisions (skipped LLM): %s", stats["prefilter_decisions"])
+        logger.debug("  - Total LLM calls made: %s", stats["llm_calls"])
+        logger.debug("  - Relevant papers found: %s", len(relevant_papers))
+
+        if pending_email is not None:
+            pending_email.result()
+    finally:
+        email_pool.shutdown()
+
+
+def exit_on_sigterm(signum, frame):
+    """Turn SIGTERM into SystemExit so cleanup in finally blocks still runs."""
+    raise SystemExit(128 + signum)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Find new arXiv papers on TOPICS and email the relevant ones.")
+    parser.add_argument(
+        "--invalidate", action="store_true", help="treat every cached decision as stale and judge papers again"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=LOG_LEVEL.upper(),
+        format="%(asctime)s %(levelname)s %(message)s",
+        stream=sys.stderr,
+    )
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # it logs every request at INFO
+    signal.signal(signal.SIGTERM, exit_on_sigterm)
+    main(invalidate=args.invalidate)